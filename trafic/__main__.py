@@ -26,11 +26,11 @@ def main() -> int:
     if not folder.is_dir():
         folder.mkdir()
 
+    # Idempotent, it also upgrades databases created by older versions.
+    # sqlite3.connect() does not allow WindowsPath, but PosixPath is OK ...
+    # So using str().
     db_file = folder / "statistics.db"
-    if not db_file.is_file():
-        # sqlite3.connect() does not allow WindowsPath, but PosixPath is OK ...
-        # So using str().
-        create_db(str(db_file))
+    create_db(str(db_file))
 
     # Allow only one instance
     lockfile = folder / "trafic.lock"
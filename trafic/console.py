@@ -24,11 +24,10 @@ class Application:
         print(f"{APP_NAME} v{__version__}")
 
         try:
-            self.worker.thr.join()
+            self.worker.join()
             return 0
         except KeyboardInterrupt:
-            self.worker.need_to_run = False
-            self.worker.thr.join()
+            self.worker.stop()
             return 0
         except Exception:
             return 1
@@ -16,6 +16,10 @@ UPDATE_URL = "https://api.github.com/repos/BoboTiG/trafic/releases"
 # Metrics retrieval interval
 DELAY = 60 * 5  # 5 minutes
 
+# Number of metrics to bufferize before saving them into the database.
+# One fsync per flush instead of one per tick (12 × 5 minutes = 1 hour).
+FLUSH_EVERY = 12
+
 # Icons
 ICON_DOWN = "↓"
 ICON_SEP = "•"
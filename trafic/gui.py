@@ -7,11 +7,14 @@ You can always get the latest version of this module at:
     https://github.com/BoboTiG/trafic
 If that URL should fail, try contacting the author.
 """
+import signal
+import socket
 import sys
+import threading
 from contextlib import suppress
 from pathlib import Path
 
-from PyQt5.QtCore import QUrl, Qt, QTimer
+from PyQt5.QtCore import QSocketNotifier, QUrl, Qt, QTimer, pyqtSignal
 from PyQt5.QtGui import QDesktopServices, QIcon
 from PyQt5.QtWidgets import (
     QApplication,
@@ -26,7 +29,7 @@ from PyQt5.QtWidgets import (
 )
 
 from . import __version__
-from .constants import APP_NAME, COLOR_DOWN, COLOR_UP, ICON_DOWN, ICON_UP
+from .constants import APP_NAME, COLOR_DOWN, COLOR_UP, DELAY, ICON_DOWN, ICON_UP
 from .utils import get_stats, sizeof_fmt
 from .worker import Worker
 
@@ -34,71 +37,137 @@ from .worker import Worker
 # Enable High-DPI
 QApplication.setAttribute(Qt.AA_EnableHighDpiScaling, True)
 
+# Stats dialog content, built once; only the counters change at display time
+STATS_HTML_TEMPLATE = f"""
+<h2 style="text-align: center">Statistiques Basiques</h2>
+<hr/>
+
+<ul style="list-style-type: none">
+    <li>Aujourd'hui :
+        <ul style="list-style-type: none">
+            <li style="color: {COLOR_DOWN}">{ICON_DOWN} {{r1d}}</li>
+            <li style="color: {COLOR_UP}">{ICON_UP} {{s1d}}</li>
+        </ul>
+    </li>
+    <li style="margin-top: 10px">Ces 7 derniers jours :
+        <ul style="list-style-type: none">
+            <li style="color: {COLOR_DOWN}">{ICON_DOWN} {{r7d}}</li>
+            <li style="color: {COLOR_UP}">{ICON_UP} {{s7d}}</li>
+        </ul>
+    </li>
+    <li style="margin-top: 10px">Ces 30 derniers jours :
+        <ul style="list-style-type: none">
+            <li style="color: {COLOR_DOWN}">{ICON_DOWN} {{r30d}}</li>
+            <li style="color: {COLOR_UP}">{ICON_UP} {{s30d}}</li>
+        </ul>
+    </li>
+    <li style="margin-top: 10px"> <b>TOTAL</b> ({{days}} jours) :
+        <ul style="list-style-type: none">
+            <li style="color: {COLOR_DOWN}">{ICON_DOWN} {{rt}}</li>
+            <li style="color: {COLOR_UP}">{ICON_UP} {{st}}</li>
+        </ul>
+    </li>
+    <!-- Keep this li to fix a bad display in the previous li -->
+    <li></li>
+</ul>
+"""
+
 
 class Application(QApplication):
+
+    # Emitted by the worker thread, handled on the GUI thread
+    tooltip_changed = pyqtSignal(str)
+
     def __init__(self, db_file: str):
         QApplication.__init__(self, [])
 
         # Little trick here!
         #
-        # Qt strongly builds on a concept called event loop.
-        # Such an event loop enables you to write parallel applications without multithreading.
-        # The concept of event loops is especially useful for applications where
-        # a long living process needs to handle interactions from a user or client.
-        # Therefore, you often will find event loops being used in GUI or web frameworks.
-        #
-        # However, the pitfall here is that Qt is implemented in C++ and not in Python.
-        # When we execute app.exec_() we start the Qt/C++ event loop, which loops
-        # forever until it is stopped.
-        #
-        # The problem here is that we don't have any Python events set up yet.
-        # So our event loop never churns the Python interpreter and so our signal
-        # delivered to the Python process is never processed. Therefore, our
-        # Python process never sees the signal until we hit some button of
-        # our Qt application window.
+        # Qt runs a C++ event loop: as long as no Python code is executed,
+        # signals (SIGINT & co) delivered to the process are never seen by
+        # the interpreter. The old workaround was a QTimer poking Python
+        # every 100 ms, which kept waking the process 10 times per second.
         #
-        # To circumvent this problem is very easy. We just need to set up a timer
-        # kicking off our event loop every few milliseconds.
+        # Instead, have the C signal handler write to one end of a socket
+        # pair (set_wakeup_fd) and let Qt watch the other end: zero wakeups
+        # while idle, and signals are still handled promptly.
         #
         # https://machinekoder.com/how-to-not-shoot-yourself-in-the-foot-using-python-qt/
-        self.timer = QTimer()
-        self.timer.timeout.connect(lambda: None)
-        self.timer.start(100)
+        self._sig_read, self._sig_write = socket.socketpair()
+        self._sig_read.setblocking(False)
+        self._sig_write.setblocking(False)
+        signal.set_wakeup_fd(self._sig_write.fileno())
+        self._sig_notifier = QSocketNotifier(
+            self._sig_read.fileno(), QSocketNotifier.Read, self
+        )
+        self._sig_notifier.activated.connect(lambda *_: self._sig_read.recv(4096))
 
         self.db = db_file
 
+        # Last tooltip set, to skip Qt work when nothing changed
+        self._last_tip = ""
+
         self.tray_icon = SystemTrayIcon(self)
         self.tray_icon.show()
 
+        # Qt widgets are not thread-safe: route tooltip updates coming
+        # from the worker thread through a queued signal.
+        self.tooltip_changed.connect(self.tray_icon.setToolTip)
+
         if hasattr(sys, "frozen") and sys.platform.startswith("win"):
             self._check_for_update()
 
-        self.worker = Worker(self, self.db)
+        # No thread here: the Qt event loop schedules the work itself
+        self.worker = Worker(self, self.db, standalone=False)
+        self.tick_timer = QTimer(self)
+        self.tick_timer.timeout.connect(self.worker.tick)
+        self.tick_timer.start(DELAY * 1000)
+        # Take the baseline sample right away
+        self.worker.tick()
+
+        # Flush pending metrics on any clean exit (session logoff, system
+        # shutdown, ...), not only when quitting via the tray menu.
+        # stop() is idempotent, a second call is a no-op.
+        self.aboutToQuit.connect(self.worker.stop)
 
     def output(self, msg: str) -> None:
         """Change the system tray tooltip."""
-        self.tray_icon.setToolTip(msg)
+        if msg != self._last_tip:
+            self._last_tip = msg
+            self.tooltip_changed.emit(msg)
 
     def _check_for_update(self) -> None:
-        """Check for a new update."""
+        """Check for a new update, without blocking the GUI."""
         try:
             from . import __version__
             from .updater.windows import Updater
 
-            updater = Updater(self.tray_icon.setToolTip)
-            updater.check(__version__)
+            # The check does blocking HTTP calls: run it in its own thread.
+            # tooltip_changed.emit() is thread-safe, Qt queues the update
+            # onto the GUI thread.
+            updater = Updater(self.tooltip_changed.emit)
+            thr = threading.Thread(
+                target=updater.check, args=(__version__,), daemon=True
+            )
+            thr.start()
         except Exception as exc:
             print(f"Erreur de MàJ automatique ({exc})", flush=True)
 
 
 class SystemTrayIcon(QSystemTrayIcon):
+
+    # Shared QIcon, the SVG is rendered only once per process
+    _icon: QIcon = None
+
     def __init__(self, app: Application) -> None:
         QSystemTrayIcon.__init__(self)
 
         self.app = app
 
-        icon = Path(getattr(sys, "_MEIPASS", ".")) / "trafic.svg"
-        self.icon = QIcon(str(icon))
+        if SystemTrayIcon._icon is None:
+            icon = Path(getattr(sys, "_MEIPASS", ".")) / "trafic.svg"
+            SystemTrayIcon._icon = QIcon(str(icon))
+        self.icon = SystemTrayIcon._icon
         self.setIcon(self.icon)
 
         self.create_menu()
@@ -142,8 +211,8 @@ class SystemTrayIcon(QSystemTrayIcon):
         """Quit the current application."""
         self.hide()
         if hasattr(self.app, "worker"):
-            self.app.worker.need_to_run = False
-            self.app.worker.thr.join()
+            self.app.tick_timer.stop()
+            self.app.worker.stop()
         self.app.exit()
 
     def open_file(self) -> None:
@@ -162,39 +231,19 @@ class SystemTrayIcon(QSystemTrayIcon):
             self._dialog = None
 
         metrics = get_stats(self.app.db)
-        html = f"""
-<h2 style="text-align: center">Statistiques Basiques</h2>
-<hr/>
-
-<ul style="list-style-type: none">
-    <li>Aujourd'hui :
-        <ul style="list-style-type: none">
-            <li style="color: {COLOR_DOWN}">{ICON_DOWN} {sizeof_fmt(metrics["1d"]["r"])}</li>
-            <li style="color: {COLOR_UP}">{ICON_UP} {sizeof_fmt(metrics["1d"]["s"])}</li>
-        </ul>
-    </li>
-    <li style="margin-top: 10px">Ces 7 derniers jours :
-        <ul style="list-style-type: none">
-            <li style="color: {COLOR_DOWN}">{ICON_DOWN} {sizeof_fmt(metrics["7d"]["r"])}</li>
-            <li style="color: {COLOR_UP}">{ICON_UP} {sizeof_fmt(metrics["7d"]["s"])}</li>
-        </ul>
-    </li>
-    <li style="margin-top: 10px">Ces 30 derniers jours :
-        <ul style="list-style-type: none">
-            <li style="color: {COLOR_DOWN}">{ICON_DOWN} {sizeof_fmt(metrics["30d"]["r"])}</li>
-            <li style="color: {COLOR_UP}">{ICON_UP} {sizeof_fmt(metrics["30d"]["s"])}</li>
-        </ul>
-    </li>
-    <li style="margin-top: 10px"> <b>TOTAL</b> ({metrics["total"]["d"]} jours) :
-        <ul style="list-style-type: none">
-            <li style="color: {COLOR_DOWN}">{ICON_DOWN} {sizeof_fmt(metrics["total"]["r"])}</li>
-            <li style="color: {COLOR_UP}">{ICON_UP} {sizeof_fmt(metrics["total"]["s"])}</li>
-        </ul>
-    </li>
-    <!-- Keep this li to fix a bad display in the previous li -->
-    <li></li>
-</ul>
-"""
+        html = STATS_HTML_TEMPLATE.format_map(
+            {
+                "r1d": sizeof_fmt(metrics["1d"]["r"]),
+                "s1d": sizeof_fmt(metrics["1d"]["s"]),
+                "r7d": sizeof_fmt(metrics["7d"]["r"]),
+                "s7d": sizeof_fmt(metrics["7d"]["s"]),
+                "r30d": sizeof_fmt(metrics["30d"]["r"]),
+                "s30d": sizeof_fmt(metrics["30d"]["s"]),
+                "rt": sizeof_fmt(metrics["total"]["r"]),
+                "st": sizeof_fmt(metrics["total"]["s"]),
+                "days": metrics["total"]["d"],
+            }
+        )
 
         dialog = QDialog()
         dialog.setWindowTitle(f"Statistiques - {APP_NAME} v{__version__}")
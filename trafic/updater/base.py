@@ -11,11 +11,13 @@ import os
 import uuid
 from abc import abstractmethod
 from tempfile import gettempdir
+from time import monotonic
 from typing import Any, Callable, Dict, List
 
 import requests
 
 from .utils import get_update_status
+from .. import __version__
 from ..constants import UPDATE_URL
 from ..utils import sizeof_fmt
 
@@ -29,7 +31,12 @@ class BaseUpdater:
         self.url = url or UPDATE_URL
 
         self.versions: List[Dict[str, Any]] = []
-        self.chunk_size = 8192
+        self.chunk_size = 1024 * 1024
+
+        # One session for the version fetch and the download: the TLS
+        # handshake with GitHub is paid only once
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = f"trafic/{__version__}"
 
     #
     # Public methods that can be overrided
@@ -70,21 +77,22 @@ class BaseUpdater:
 
         self.callback(f"Téléchargement de la version {version} dans {path}")
 
-        with requests.get(url, stream=True) as req, open(path, "wb") as tmp:
+        last_report = 0.0
+        with self.session.get(url, stream=True) as req, open(path, "wb") as tmp:
             for n, chunk in enumerate(req.iter_content(self.chunk_size), 1):
                 tmp.write(chunk)
-                size = sizeof_fmt(n * self.chunk_size, suffix="o")
-                self.callback(f"Mise à jour : téléchargé {size} sur {total_size}")
-
-            # Force write of file to disk
-            tmp.flush()
-            os.fsync(tmp.fileno())
+                # Do not spam the tooltip on every chunk
+                now = monotonic()
+                if now - last_report >= 0.5:
+                    last_report = now
+                    size = sizeof_fmt(n * self.chunk_size, suffix="o")
+                    self.callback(f"Mise à jour : téléchargé {size} sur {total_size}")
 
         return path
 
     def _fetch_versions(self) -> None:
         """ Fetch available versions. It sets `self.versions` on success. """
-        with requests.get(self.url) as resp:
+        with self.session.get(self.url) as resp:
             resp.raise_for_status()
             self.versions = resp.json()
 
@@ -7,8 +7,7 @@ You can always get the latest version of this module at:
     https://github.com/BoboTiG/trafic
 If that URL should fail, try contacting the author.
 """
-from distutils.version import StrictVersion
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Tuple
 
 __all__ = ("get_update_status",)
 
@@ -16,11 +15,24 @@ Version = Dict[str, Any]
 Versions = List[Version]
 
 
+def version_key(version: str) -> Tuple[int, ...]:
+    """Sortable key of a "X.Y.Z" or "X.Y.ZbN" version string.
+
+    A beta sorts before its final release:
+
+        >>> version_key("0.4.5b1") < version_key("0.4.5")
+        True
+    """
+    major, minor, patch = version.split(".")
+    if "b" in patch:
+        patch, beta = patch.split("b")
+        return (int(major), int(minor), int(patch), 0, int(beta))
+    return (int(major), int(minor), int(patch), 1, 0)
+
+
 def get_latest_version(versions: Versions) -> str:
     """ Get the most recent version. """
-    versions_currated = [version["name"] for version in versions]
-    highest = str(max(map(StrictVersion, versions_currated)))
-    return highest  # ᕦ(ò_óˇ)ᕤ
+    return max((version["name"] for version in versions), key=version_key)  # ᕦ(ò_óˇ)ᕤ
 
 
 def get_update_status(current_version: str, versions: Versions) -> str:
@@ -29,17 +41,7 @@ def get_update_status(current_version: str, versions: Versions) -> str:
         return ""
 
     latest = get_latest_version(versions)
-    if not latest or StrictVersion(latest) <= StrictVersion(current_version):
+    if version_key(latest) <= version_key(current_version):
         return ""
 
-    # StrictVersion.__str__() will strip the leading ".0", just restore it
-    #
-    #   >>> StrictVersion("0.2.0")
-    #   StrictVersion ('0.2')
-    #   >>> str(StrictVersion("0.2.0"))
-    #   '0.2'
-    #
-    if latest.count(".") == 1:
-        latest += ".0"
-
     return latest
@@ -10,6 +10,7 @@ If that URL should fail, try contacting the author.
 from subprocess import Popen
 from time import sleep
 
+from PyQt5.QtCore import QMetaObject, Qt
 from PyQt5.QtWidgets import qApp
 
 from .base import BaseUpdater
@@ -35,5 +36,7 @@ class Updater(BaseUpdater):
         cmd = f'ping 127.0.0.1 -n 6 > nul && "{filename}" /silent'
         Popen(cmd, shell=True, close_fds=True)
 
-        # Exit the the app
-        qApp.quit()
+        # Exit the the app. check() runs in its own thread and quit() is
+        # not thread-safe in Qt 5: queue the call onto the GUI thread.
+        # Pending metrics are flushed by the aboutToQuit handler.
+        QMetaObject.invokeMethod(qApp, "quit", Qt.QueuedConnection)
@@ -7,52 +7,121 @@ You can always get the latest version of this module at:
     https://github.com/BoboTiG/trafic
 If that URL should fail, try contacting the author.
 """
-from datetime import datetime
-from sqlite3 import connect
-from typing import Dict, List, Tuple
+import os
+from functools import lru_cache
+from sqlite3 import Connection, connect
+from time import monotonic
+from typing import Dict, Iterator, List, Tuple
 
 from psutil import net_io_counters
 
-from .constants import ICON_DOWN, ICON_SEP, ICON_UP
+from .constants import DELAY, ICON_DOWN, ICON_SEP, ICON_UP
+
+# Day bucket of a Statistics row. The CASE keeps databases created before
+# version 0.5 working: old rows store ISO datetimes, new ones integer
+# Unix epochs.
+DAY_SQL = (
+    "CASE WHEN typeof(run_at) = 'integer'"
+    "     THEN strftime('%Y-%m-%d', run_at, 'unixepoch', 'localtime')"
+    "     ELSE strftime('%Y-%m-%d', run_at)"
+    " END"
+)
+
+# All currently known binary prefixes
+UNITS = ("", "Ki", "Mi", "Gi", "Ti", "Pi", "Ei", "Zi", "Yi")
+
+# Interfaces whose traffic is not counted: loopback plus the usual virtual
+# adapters (containers, VMs, tunnels) that would double-count bytes already
+# seen on the physical NIC. Overridable with the TRAFIC_SKIP_IFACES envar,
+# a comma-separated list of name prefixes; set it empty to count everything.
+SKIP_IFACES = tuple(
+    p
+    for p in os.getenv("TRAFIC_SKIP_IFACES", "lo,docker,veth,br-,virbr,tun").split(",")
+    if p
+)
+
+
+def open_db(db: str) -> Connection:
+    """Open a database connection with good performance defaults.
+
+    WAL does one fsync per commit instead of two with the default
+    rollback journal, and lets readers run while the worker writes.
+    """
+    conn = connect(db)
+    cur = conn.cursor()
+    cur.execute("PRAGMA journal_mode = WAL")
+    cur.execute("PRAGMA synchronous = NORMAL")
+    cur.execute("PRAGMA temp_store = MEMORY")
+    cur.execute("PRAGMA cache_size = -16000")  # 16 MiB
+    cur.execute("PRAGMA mmap_size = 67108864")  # 64 MiB
+    return conn
 
 
 def create_db(db: str) -> None:
-    """Create the metrics database."""
-    with connect(db) as conn:
-        conn.cursor().execute(
+    """Create (or upgrade) the metrics database."""
+    with open_db(db) as conn:
+        cur = conn.cursor()
+        cur.execute(
             "CREATE TABLE IF NOT EXISTS Statistics ("
-            "    run_at   DATETIME,"
+            "    run_at   INTEGER,"  # Unix epoch, truncated to the minute
             "    received INTEGER,"
             "    sent     INTEGER,"
             "    PRIMARY KEY (run_at)"
             ")"
         )
 
+        # Per-day totals, maintained on each flush so that displaying
+        # statistics does not have to scan the whole history
+        cur.execute(
+            "CREATE TABLE IF NOT EXISTS DailyTotals ("
+            "    day      TEXT,"  # YYYY-MM-DD
+            "    received INTEGER,"
+            "    sent     INTEGER,"
+            "    PRIMARY KEY (day)"
+            ")"
+        )
 
-def get(db: str, days: int = 0) -> List[Tuple[str, int, int]]:
-    """Get metrics from the database."""
-    sql = (
-        "  SELECT strftime('%Y-%m-%d', run_at) d, SUM(received), SUM(sent)"
-        "    FROM Statistics "
-        "GROUP BY d "
-        "ORDER BY d DESC"
-    )
-    if days > 0:
-        sql += f" LIMIT {days}"
-
-    with connect(db) as conn:
-        return conn.cursor().execute(sql).fetchall()
+        # Backfill totals for days recorded by older versions
+        cur.execute(
+            "INSERT OR IGNORE INTO DailyTotals"
+            f"  SELECT {DAY_SQL} d, SUM(received), SUM(sent)"
+            "     FROM Statistics "
+            " GROUP BY d"
+        )
 
 
-def update(db: str, received: int, sent: int) -> None:
-    """Save metrics in the database."""
-    run_at = datetime.now().replace(second=0, microsecond=0)
+def get(db: str, days: int = 0) -> Iterator[Tuple[str, int, int]]:
+    """Get metrics from the database, most recent day first."""
+    sql = (
+        "  SELECT day, received, sent"
+        "    FROM DailyTotals "
+        "ORDER BY day DESC "
+        "   LIMIT ?"
+    )
 
-    with connect(db) as conn:
-        conn.cursor().execute(
-            "INSERT OR IGNORE INTO Statistics(run_at, received, sent)"
-            "               VALUES (?, ?, ?)",
-            (run_at, received, sent),
+    with open_db(db) as conn:
+        # LIMIT -1 means no limit
+        yield from conn.cursor().execute(sql, (days if days > 0 else -1,))
+
+
+def update(conn: Connection, rows: List[Tuple[int, int, int]]) -> None:
+    """Save metrics in the database, all rows within a single transaction."""
+    with conn:
+        conn.cursor().executemany(
+            "INSERT INTO Statistics(run_at, received, sent)"
+            "     VALUES (?, ?, ?)"
+            "         ON CONFLICT(run_at) DO UPDATE SET"
+            "            received = received + excluded.received,"
+            "            sent     = sent + excluded.sent",
+            rows,
+        )
+        conn.cursor().executemany(
+            "INSERT INTO DailyTotals(day, received, sent)"
+            "     VALUES (strftime('%Y-%m-%d', ?, 'unixepoch', 'localtime'), ?, ?)"
+            "         ON CONFLICT(day) DO UPDATE SET"
+            "            received = received + excluded.received,"
+            "            sent     = sent + excluded.sent",
+            rows,
         )
 
 
@@ -63,42 +132,59 @@ def tooltip(received: int, sent: int) -> str:
 
 def metrics() -> Tuple[int, int]:
     """Retreive bytes received and sent."""
-    stats = net_io_counters(nowrap=True)
-    return stats.bytes_recv, stats.bytes_sent
+    received = sent = 0
+    for name, stats in net_io_counters(pernic=True, nowrap=True).items():
+        if name.startswith(SKIP_IFACES):
+            continue
+        received += stats.bytes_recv
+        sent += stats.bytes_sent
+    return received, sent
+
+
+# Cached get_stats() result: new data only lands every *DELAY* seconds,
+# no need to query the database more often than that
+_stats_cache: Tuple[str, float, Dict[str, Dict[str, int]]] = ("", 0.0, {})
+
+
+def invalidate_stats_cache() -> None:
+    """Force the next get_stats() call to hit the database."""
+    global _stats_cache
+    _stats_cache = ("", 0.0, {})
 
 
 def get_stats(db: str) -> Dict[str, Dict[str, int]]:
     """Retreive statistics and pre-format them into a dict."""
-    filtered_metrics = {
-        "1d": {"r": 0, "s": 0},
-        "7d": {"r": 0, "s": 0},
-        "30d": {"r": 0, "s": 0},
-        "total": {"r": 0, "s": 0, "d": 0},
+    global _stats_cache
+
+    cached_db, when, cached = _stats_cache
+    if cached_db == db and monotonic() - when < DELAY:
+        return cached
+
+    sql = (
+        "SELECT SUM(CASE WHEN day >= date('now', 'localtime') THEN received END),"
+        "       SUM(CASE WHEN day >= date('now', 'localtime') THEN sent END),"
+        "       SUM(CASE WHEN day >= date('now', 'localtime', '-6 days') THEN received END),"
+        "       SUM(CASE WHEN day >= date('now', 'localtime', '-6 days') THEN sent END),"
+        "       SUM(CASE WHEN day >= date('now', 'localtime', '-29 days') THEN received END),"
+        "       SUM(CASE WHEN day >= date('now', 'localtime', '-29 days') THEN sent END),"
+        "       SUM(received), SUM(sent), COUNT(*)"
+        "  FROM DailyTotals"
+    )
+    with open_db(db) as conn:
+        row = conn.cursor().execute(sql).fetchone()
+    r1, s1, r7, s7, r30, s30, rt, st, days = (value or 0 for value in row)
+
+    stats = {
+        "1d": {"r": r1, "s": s1},
+        "7d": {"r": r7, "s": s7},
+        "30d": {"r": r30, "s": s30},
+        "total": {"r": rt, "s": st, "d": days},
     }
-    for n, (_, received, sent) in enumerate(get(db)):
-        if n < 1:
-            filtered_metrics["1d"]["r"] += received
-            filtered_metrics["1d"]["s"] += sent
-            filtered_metrics["7d"]["r"] += received
-            filtered_metrics["7d"]["s"] += sent
-            filtered_metrics["30d"]["r"] += received
-            filtered_metrics["30d"]["s"] += sent
-        elif n < 7:
-            filtered_metrics["7d"]["r"] += received
-            filtered_metrics["7d"]["s"] += sent
-            filtered_metrics["30d"]["r"] += received
-            filtered_metrics["30d"]["s"] += sent
-        elif n < 30:
-            filtered_metrics["30d"]["r"] += received
-            filtered_metrics["30d"]["s"] += sent
-
-        filtered_metrics["total"]["r"] += received
-        filtered_metrics["total"]["s"] += sent
-        filtered_metrics["total"]["d"] += 1
-
-    return filtered_metrics
+    _stats_cache = (db, monotonic(), stats)
+    return stats
 
 
+@lru_cache(maxsize=512)
 def sizeof_fmt(num: int, suffix: str = "o") -> str:
     """
     Human readable version of file size.
@@ -117,12 +203,15 @@ def sizeof_fmt(num: int, suffix: str = "o") -> str:
 
     Source: https://stackoverflow.com/a/1094933/1117028
     """
-    val = float(num)
-    for unit in ("", "Ki", "Mi", "Gi", "Ti", "Pi", "Ei", "Zi"):
-        if abs(val) < 1024.0:
-            return f"{val:3.1f} {unit}{suffix}"
+    # One shift per 1024 factor: pick the unit straight from the magnitude
+    n = abs(num)
+    idx = 0 if n < 1024 else min((n.bit_length() - 1) // 10, len(UNITS) - 1)
+    val = num / (1 << (idx * 10))
+    if abs(val) >= 1024.0 and idx < len(UNITS) - 1:
+        # The division rounded up to 1024.0, move to the next unit
+        idx += 1
         val /= 1024.0
-    return f"{val:.1f} Yi{suffix}"
+    return f"{val:3.1f} {UNITS[idx]}{suffix}"
 
 
 def display_stats(db: str):
@@ -7,67 +7,155 @@ You can always get the latest version of this module at:
     https://github.com/BoboTiG/trafic
 If that URL should fail, try contacting the author.
 """
+import os
+import sys
 import threading
-import time
-from typing import TYPE_CHECKING
+from contextlib import suppress
+from time import time
+from typing import TYPE_CHECKING, List, Optional, Tuple
 
-from .constants import DELAY
-from .utils import metrics, tooltip, update
+from .constants import DELAY, FLUSH_EVERY
+from .utils import invalidate_stats_cache, metrics, open_db, tooltip, update
 
 if TYPE_CHECKING:
+    from sqlite3 import Connection
     from .console import Application  # noqa
 
 
+class TickState:
+    """Counters carried from one tick to the next."""
+
+    # No __dict__: fixed attributes, cheaper lookups
+    __slots__ = ("last_received", "last_sent", "cumul_rec", "cumul_sen", "first_run")
+
+    def __init__(self) -> None:
+        self.last_received = 0
+        self.last_sent = 0
+        self.cumul_rec = 0
+        self.cumul_sen = 0
+        self.first_run = True
+
+
 class Worker:
-    def __init__(self, app: "Application", db_file: str):
+    def __init__(self, app: "Application", db_file: str, standalone: bool = True):
         self.db = db_file
         self.app = app
 
-        self.need_to_run = True
+        # Set to ask the worker to stop
+        self._stop = threading.Event()
 
-        self.thr = threading.Thread(target=self.run)
-        self.thr.start()
+        # Metrics not yet saved into the database
+        self._pending: List[Tuple[int, int, int]] = []
 
-    def run(self) -> None:
-        """The endless loop that will do the work."""
-        last_received = last_sent = cumul_rec = cumul_sen = 0
-        first_run = True
+        # The persistent connection, opened lazily by the first tick()
+        # so that it belongs to whatever thread does the work
+        self.conn: Optional["Connection"] = None
 
-        while self.need_to_run:
+        # Per-tick counters
+        self.state = TickState()
+
+        # Last tooltip sent to the application, to skip no-op updates
+        self._last_tooltip = ""
+
+        # In standalone mode the worker drives itself with a thread;
+        # the GUI drives tick() from a QTimer instead (no thread at all).
+        self.thr = threading.Thread(target=self.run) if standalone else None
+        if self.thr:
+            self.thr.start()
+
+    def close(self) -> None:
+        """Flush pending metrics and close the database connection."""
+        if self.conn:
             try:
-                rec, sen = metrics()
-
-                if first_run:
-                    # We want to record metrics only when the application is running,
-                    # so the first time we skip metrics as on GNU/Linux we will have
-                    # huge data and it will blow up statistics.
-                    first_run = False
-                    self.app.output(f"Enregistrement en cours ... ({DELAY // 60} min)")
-                else:
-                    if rec >= last_received and sen >= last_sent:
-                        # Susbstract new values to old ones to keep revelant values.
-                        diff_rec = rec - last_received
-                        diff_sen = sen - last_sent
-                    else:
-                        # On Windows, when the network adaptater is re-enabled,
-                        # on session reload or on a computer crash, adaptater
-                        # statistics are resetted.
-                        diff_rec, diff_sen = rec, sen
-
-                    cumul_rec += diff_rec
-                    cumul_sen += diff_sen
-                    update(self.db, diff_rec, diff_sen)
-                    self.app.output(tooltip(cumul_rec, cumul_sen))
-
-                last_received, last_sent = rec, sen
+                self.flush()
             except Exception as exc:
                 print(exc, flush=True)
+            finally:
+                self.conn.close()
+                self.conn = None
+
+    def flush(self) -> None:
+        """Save pending metrics into the database."""
+        if self._pending and self.conn:
+            update(self.conn, self._pending)
+            self._pending.clear()
+            invalidate_stats_cache()
+
+    def tick(self) -> None:
+        """Fetch metrics and record the diff since the previous tick."""
+        state = self.state
+        try:
+            if self.conn is None:
+                self.conn = open_db(self.db)
 
+            rec, sen = metrics()
+
+            if state.first_run:
+                # We want to record metrics only when the application is running,
+                # so the first time we skip metrics as on GNU/Linux we will have
+                # huge data and it will blow up statistics.
+                state.first_run = False
+                self.app.output(f"Enregistrement en cours ... ({DELAY // 60} min)")
+            else:
+                # Susbstract new values to old ones to keep revelant values.
+                # On Windows, when the network adaptater is re-enabled,
+                # on session reload or on a computer crash, adaptater
+                # statistics are resetted: a reset counter restarts from
+                # its raw value, without touching the other one.
+                diff_rec = (
+                    rec - state.last_received if rec >= state.last_received else rec
+                )
+                diff_sen = sen - state.last_sent if sen >= state.last_sent else sen
+
+                state.cumul_rec += diff_rec
+                state.cumul_sen += diff_sen
+                # Truncated to the minute, as the former DATETIME was
+                run_at = int(time()) // 60 * 60
+                self._pending.append((run_at, diff_rec, diff_sen))
+                if len(self._pending) >= FLUSH_EVERY:
+                    self.flush()
+                tip = tooltip(state.cumul_rec, state.cumul_sen)
+                if tip != self._last_tooltip:
+                    self._last_tooltip = tip
+                    self.app.output(tip)
+
+            state.last_received, state.last_sent = rec, sen
+        except Exception as exc:
+            print(exc, flush=True)
+
+    def join(self) -> None:
+        """Wait for the standalone thread to finish, if there is one."""
+        if self.thr:
+            self.thr.join()
+
+    def run(self) -> None:
+        """The endless loop that will do the work."""
+        # A background sampler should not compete with foreground work
+        with suppress(OSError):
+            if sys.platform.startswith("win"):
+                from ctypes import windll
+
+                # -1 is THREAD_PRIORITY_BELOW_NORMAL
+                kernel32 = windll.kernel32
+                kernel32.SetThreadPriority(kernel32.GetCurrentThread(), -1)
+            else:
+                os.nice(10)
+
+        while not self._stop.is_set():
+            self.tick()
             self.wait()
 
+        # Do not lose the last metrics on exit
+        self.close()
+
+    def stop(self) -> None:
+        """Ask the worker to stop and wait for the work to finish."""
+        self._stop.set()
+        if self.thr:
+            self.thr.join()
+        else:
+            self.close()
+
     def wait(self) -> None:
-        """Wait *DELAY* seconds and check for app exit every second."""
-        for _ in range(DELAY):
-            if not self.need_to_run:
-                break
-            time.sleep(1)
+        """Wait *DELAY* seconds, returning early on app exit."""
+        self._stop.wait(DELAY)